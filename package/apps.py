@@ -3,16 +3,18 @@ from __future__ import annotations
 import contextvars
 from typing import TYPE_CHECKING, overload, Any
 
+import numpy as np
 from numpy.typing import ArrayLike
 
 from package.code import Code, Dockerfile
-from package.context import app_context, make_warnings_ctx, print_warnings
+from package.context import app_ctx, make_warnings_ctx, print_warnings
 from package.cs import CsCode, ProgramCs
 from package.html import Html
 from package.html_output import tabulate_html, JupyterHTMLStr
 from package.xml import Process, Xml
 
-from .iter import IterContainer, IterController
+from .archive import ArchiveCache, ZipArchive
+from .iter import IterContainer, IterController, mark_worker_thread
 from .json import Appsettings, Json, TextResource
 from .layout_sets import (
     Component,
@@ -25,8 +27,8 @@ from .layout_sets import (
     RuleHandler,
 )
 from .plotting import setup_plot
-from .repo import Environment, StudioEnvironment, VersionLock
-from .version import NullableStr, Version
+from .repo import Environment, StudioEnvironment, VersionLock, VersionsData, VersionsLock
+from .version import NullableStr, Version, parse_version
 
 if TYPE_CHECKING:
     from _typeshed import SupportsRichComparison
@@ -35,22 +37,183 @@ import base64
 import csv
 import io
 import json
+import os
 import re
-from concurrent.futures import ThreadPoolExecutor
-from copy import copy
-from functools import cached_property
-from io import BufferedReader
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from functools import cache, cached_property
+from operator import methodcaller
 from pathlib import Path
-from typing import Callable, cast
-from zipfile import ZipFile
+from typing import Callable, Iterable, Iterator, NamedTuple, cast
 
+import rapidjson
+from lxml.etree import _Element
 from IPython.display import display_html
 from tabulate import tabulate
 
+APPLICATION_METADATA_PATH = re.compile(r"/App/config/applicationmetadata\.json$")
+LAYOUT_SETS_PATH = re.compile(r"/App/ui/layout-sets\.json$")
+TEXT_RESOURCE_PATH = re.compile(r"/App/config/texts/resource\.[a-z]{2}\.json$")
+APP_SETTINGS_PATH = re.compile(r"/App/appsettings(\.[^.]+)?\.json$")
+CS_PATH = re.compile(r"\.cs$")
+PROGRAM_CS_PATH = re.compile(r"/App/Program\.cs$")
+INDEX_CSHTML_PATH = re.compile(r"/App/views/Home/Index\.cshtml$")
+PROCESS_PATH = re.compile(r"/App/config/process/process\.bpmn$")
+POLICY_PATH = re.compile(r"/App/config/authorization/policy\.xml$")
+CSPROJ_PATH = re.compile(r"\.csproj$")
+DOCKERFILE_PATH = re.compile(r"Dockerfile")
+
+
+class LayoutSetPaths(NamedTuple):
+    layouts: re.Pattern[str]
+    form_layout: re.Pattern[str]
+    settings: re.Pattern[str]
+    rule_configuration: re.Pattern[str]
+    rule_handler: re.Pattern[str]
+
+
+@cache
+def layout_set_paths(base_path: str) -> LayoutSetPaths:
+    """Layout set ids repeat across apps, so the patterns for each base path are only compiled once"""
+    return LayoutSetPaths(
+        re.compile(rf"{base_path}layouts/[^/]+\.json$"),
+        re.compile(rf"{base_path}FormLayout\.json$"),
+        re.compile(rf"{base_path}Settings\.json$"),
+        re.compile(rf"{base_path}RuleConfiguration\.json$"),
+        re.compile(rf"{base_path}RuleHandler\.js$"),
+    )
+
+
+REGEX_SPECIAL = frozenset(".^$*+?{}[]|()")
+# A pattern source ending in an escaped dot, an extension and an end anchor, e.g. `\.json$`
+PATTERN_EXTENSION = re.compile(r"(?<!\\)\\\.(\w+)\$$")
+
+
+def as_literal(pattern: str) -> str | None:
+    """Returns the text matched by a pattern without regex syntax (other than escaped characters), else None"""
+    literal: list[str] = []
+    escaped = False
+    for char in pattern:
+        if escaped:
+            # Escaped letters and digits are classes or references like \d and \1
+            if char.isalnum():
+                return None
+            literal.append(char)
+            escaped = False
+        elif char == "\\":
+            escaped = True
+        elif char in REGEX_SPECIAL:
+            return None
+        else:
+            literal.append(char)
+    return None if escaped else "".join(literal)
+
+
+# Comments and the content of raw text elements are not markup, a script tag written inside e.g. another script is not a
+# tag the browser would load. Only script start tags outside of these are candidates
+HTML_RAW_TEXT = re.compile(
+    rb"""<!--.*?(?:-->|\Z)|<(script|style|textarea|title)\b(?:[^>"']|"[^"]*"|'[^']*')*>.*?(?:</\1(?=[\s/>])|\Z)""",
+    re.IGNORECASE | re.DOTALL,
+)
+# The same elements taken apart, to find them in a file read in chunks
+RAW_TEXT_START = re.compile(rb"<(?:!--|(script|style|textarea|title)\b)", re.IGNORECASE)
+RAW_TEXT_START_TAG = re.compile(rb"""<(script|style|textarea|title)\b(?:[^>"']|"[^"]*"|'[^']*')*>""", re.IGNORECASE)
+RAW_TEXT_END = {
+    b"script": re.compile(rb"</script(?=[\s/>])", re.IGNORECASE),
+    b"style": re.compile(rb"</style(?=[\s/>])", re.IGNORECASE),
+    b"textarea": re.compile(rb"</textarea(?=[\s/>])", re.IGNORECASE),
+    b"title": re.compile(rb"</title(?=[\s/>])", re.IGNORECASE),
+}
+COMMENT_END = re.compile(rb"-->")
+# Longest start or end of an element that can be cut off at the end of a chunk, e.g. `</textarea` and the next byte
+RAW_TEXT_OVERLAP = len(b"</textarea>")
+FRONTEND_SCRIPT = re.compile(
+    rb"""(?i:<script\b(?:[^>"']|"[^"]*"|'[^']*')*?\ssrc)\s*=\s*(["']?)https://altinncdn\.no/toolkits/altinn-app-frontend/([a-zA-Z0-9\-.]+)/altinn-app-frontend\.js\1(?=[\s/>])"""
+)
+APP_PACKAGE = re.compile(r"Altinn\.App\.(Core|Api|Common)(\.Experimental)?", re.IGNORECASE)
+
+# Versions only depend on the deployed commit, so they are kept for the lifetime of the process
+version_cache: dict[tuple[str, str], tuple[Version, Version]] = {}
+dotnet_version_cache: dict[tuple[str, str], NullableStr] = {}
+# Versions found in this session that are not saved next to the lock file yet
+unsaved_versions: set[tuple[str, str]] = set()
+# Zip file of every deployment loaded by `Apps.init`, the versions are saved next to it
+app_files: dict[tuple[str, str], Path] = {}
+
+
+def frontend_version(index_cshtml: bytes) -> str | None:
+    # Cheap literal checks first, most files never reach the regex engine
+    if b"altinn-app-frontend" not in index_cshtml:
+        return None
+    for element in HTML_RAW_TEXT.finditer(index_cshtml):
+        if (
+            element.group(1) is not None
+            and element.group(1).lower() == b"script"
+            and (match := FRONTEND_SCRIPT.match(index_cshtml, element.start())) is not None
+        ):
+            return match.group(2).decode()
+    return None
+
+
+def frontend_version_in_chunks(chunks: Iterable[bytes]) -> str | None:
+    """
+    `frontend_version` of a file read in chunks, stopping at the first match. Between chunks only what can still be part
+    of a match is kept, an unfinished start tag or the last few bytes, so the file is searched about once
+    """
+    data = b""
+    position = 0
+    # The end of the comment or raw text element the position is in
+    end: re.Pattern[bytes] | None = None
+    for chunk in chunks:
+        data = data[position:] + chunk
+        position = 0
+        while True:
+            if end is not None:
+                if (match := end.search(data, position)) is None:
+                    position = max(position, len(data) - RAW_TEXT_OVERLAP)
+                    break
+                position, end = match.end(), None
+            elif (start := RAW_TEXT_START.search(data, position)) is None:
+                position = max(position, len(data) - RAW_TEXT_OVERLAP)
+                break
+            elif start.group(1) is None:
+                position, end = start.end(), COMMENT_END
+            elif (tag := RAW_TEXT_START_TAG.match(data, start.start())) is None:
+                # Unfinished, the start tag is searched again with the next chunk
+                position = start.start()
+                break
+            elif (name := tag.group(1).lower()) == b"script" and (
+                match := FRONTEND_SCRIPT.match(data, tag.start())
+            ) is not None:
+                return match.group(2).decode()
+            else:
+                position, end = tag.end(), RAW_TEXT_END[name]
+
+    # A start tag that is never finished is not markup, the search goes on right after it as in `frontend_version`
+    if end is None and (start := RAW_TEXT_START.search(data, position)) is not None:
+        return frontend_version(data[start.start() + 1 :])
+    return None
+
+
+def package_versions(csproj: Xml) -> Iterator[str]:
+    """Versions of the Altinn.App.* package references in a parsed .csproj file, as the XPath query it replaced"""
+    if not isinstance(csproj.element, _Element):
+        return
+    for reference in csproj.element.iterdescendants("PackageReference"):
+        if (include := reference.get("Include")) is not None and APP_PACKAGE.fullmatch(include) is not None:
+            if (version := reference.get("Version")) is not None:
+                yield version
+
 
 class App:
     def __init__(
-        self, env: Environment, org: str, app: str, commit_sha: str, studio_env: StudioEnvironment, app_dir: Path
+        self,
+        env: Environment,
+        org: str,
+        app: str,
+        commit_sha: str,
+        studio_env: StudioEnvironment,
+        app_dir: Path,
+        archives: ArchiveCache | None = None,
     ):
         self.env: Environment = env
         self.org = org
@@ -58,11 +221,14 @@ class App:
         self.commit_sha = commit_sha
         self.studio_env = studio_env
         self.app_dir = app_dir
-        self.data = {}
-
-    @property
-    def key(self):
-        return f"{self.env}-{self.org}-{self.app}"
+        # Used for every cache lookup and every time the zip file is opened, so they are only built once
+        self.key = f"{env}-{org}-{app}"
+        self.file_path = app_dir.joinpath(f"{self.key}.zip")
+        self.archives = archives
+        self.set_data({})
+        self.open = False
+        self.__prefetched: dict[str, bytes] = {}
+        self.__paths: dict[re.Pattern[str], list[str]] = {}
 
     @property
     def repo_key(self):
@@ -76,10 +242,6 @@ class App:
     def file_name(self):
         return f"{self.key}.zip"
 
-    @property
-    def file_path(self):
-        return self.app_dir.joinpath(self.file_name)
-
     @property
     def app_url(self):
         return (
@@ -111,17 +273,17 @@ class App:
     def with_data(self, data: dict[str, object]) -> App:
         if self.open:
             raise Exception("Attempted to copy an `App` object while open for reading, this could cause weird issues!")
-        app = copy(self)
-        app.data = data
+        # Shallow clone that shares everything already read from the zip file, but not the open file handles
+        app = object.__new__(App)
+        app.__dict__ = {key: value for key, value in self.__dict__.items() if key != "_App__zip_file"}
+        app.set_data(data)
         return app
 
-    @cached_property
-    def data_keys(self) -> list[str]:
-        return list(self.data.keys())
-
-    @cached_property
-    def data_values(self) -> list[object]:
-        return list(self.data.values())
+    def set_data(self, data: dict[str, object]):
+        # Plain attributes, these are read for every row when printing tables
+        self.data = data
+        self.data_keys = tuple(data.keys())
+        self.data_values = tuple(data.values())
 
     def __getitem__(self, key: str) -> Any:
         return self.data[key]
@@ -131,12 +293,17 @@ class App:
     # Also sets a context-variable for logging purposes
     @staticmethod
     def wrap_open_app[T](__func: Callable[[App], T]) -> Callable[[App], T]:
+        # Runs for every app in every pipeline stage, so the two context managers are inlined as a single try/finally
         def func(app: App) -> T:
-            with app_context(app):
-                with app as open_app:
-                    result = __func(open_app)
-                    result.__repr__()  # Make sure iterators are consumed while we are open
-                    return result
+            token = app_ctx.set(app)
+            app.open = True
+            try:
+                result = __func(app)
+                result.__repr__()  # Make sure iterators are consumed while we are open
+                return result
+            finally:
+                app.__exit__(None, None, None)
+                app_ctx.reset(token)
 
         return func
 
@@ -148,8 +315,7 @@ class App:
 
         return func
 
-    __file: BufferedReader | None = None
-    __zip_file: ZipFile | None = None
+    __zip_file: ZipArchive | None = None
 
     def __enter__(self):
         self.open = True
@@ -157,70 +323,137 @@ class App:
 
     def __exit__(self, type, value, traceback):
         self.open = False
-        if self.__zip_file is not None:
+        # Most apps are never actually opened, e.g. when a predicate only looks at `env` or a cached version
+        if self.__zip_file is None:
+            return
+        if self.archives is not None:
+            self.archives.release(self.file_path)
+        else:
             self.__zip_file.close()
-            self.__zip_file = None
-        if self.__file is not None:
-            self.__file.close()
-            self.__file = None
+        self.__zip_file = None
 
     @property
-    def content(self) -> ZipFile:
+    def content(self) -> ZipArchive:
         if not self.open:
             raise Exception("Tried to access `App.content` without first opening the file using the `with` keyword")
         if self.__zip_file is None:
-            self.__file = open(self.file_path, "rb")
-            self.__zip_file = ZipFile(self.__file)
+            if self.archives is not None:
+                self.__zip_file = self.archives.acquire(self.file_path)
+            else:
+                self.__zip_file = ZipArchive(open(self.file_path, "rb"))
         return self.__zip_file
 
     @cached_property
     def files(self) -> list[str]:
         return self.content.namelist()
 
-    def file_exists(self, file_pattern: str):
-        return IterContainer(self.files).filter(lambda path: re.search(file_pattern, path) is not None).is_not_empty
+    def read(self, path: str) -> bytes:
+        if (data := self.__prefetched.get(path)) is not None:
+            return data
+        return self.content.read(path)
 
-    def files_matching(self, file_pattern: str):
-        return (
-            IterContainer(self.files)
-            .filter(lambda path: re.search(file_pattern, path) is not None)
-            .map(lambda path: (self.content.read(path), path, self.get_remote_file_url(path)))
+    def read_chunks(self, path: str, size=16384) -> Iterator[bytes]:
+        if (data := self.__prefetched.get(path)) is not None:
+            yield data
+            return
+        yield from self.content.read_chunks(path, size)
+
+    def prefetch(self, file_patterns: Iterable[str | re.Pattern[str]]):
+        """Keeps the matching files in memory so later reads do not have to open the zip file"""
+        for file_pattern in file_patterns:
+            for path in self.paths_matching(file_pattern):
+                self.__prefetched[path] = self.content.read(path)
+
+    @staticmethod
+    @cache
+    def make_pattern(file_pattern: str | re.Pattern[str]) -> re.Pattern[str]:
+        """Patterns built at runtime (e.g. per layout set) are compiled once and reused for every app"""
+        return re.compile(file_pattern)
+
+    @staticmethod
+    @cache
+    def make_matcher(file_pattern: str | re.Pattern[str]) -> Callable[[str], object]:
+        """
+        Most file patterns are a literal path suffix, which is much cheaper to check with string methods.
+        Matchers are `pattern.search` or an `operator.methodcaller` rather than lambdas, their result (a bool or a match)
+        is only checked for truthiness.
+        """
+        pattern = App.make_pattern(file_pattern)
+        # Flags like IGNORECASE or VERBOSE change what even a literal looking pattern matches
+        if pattern.flags & ~re.UNICODE:
+            return pattern.search
+        if pattern.pattern.endswith("$") and (suffix := as_literal(pattern.pattern[:-1])) is not None:
+            return methodcaller("endswith", suffix)
+        if (literal := as_literal(pattern.pattern)) is not None:
+            return methodcaller("__contains__", literal)
+        return pattern.search
+
+    @staticmethod
+    @cache
+    def pattern_extension(file_pattern: str | re.Pattern[str]) -> str | None:
+        """The file extension every match must end with, for patterns like `...\\.json$` without alternation"""
+        pattern = App.make_pattern(file_pattern)
+        if pattern.flags & ~re.UNICODE or "|" in pattern.pattern:
+            return None
+        match = PATTERN_EXTENSION.search(pattern.pattern)
+        return match.group(1) if match is not None else None
+
+    @cached_property
+    def files_by_extension(self) -> dict[str, list[str]]:
+        """Files grouped by extension in one pass, so each pattern only scans files that could match it"""
+        files_by_extension: dict[str, list[str]] = {}
+        for path in self.files:
+            files_by_extension.setdefault(path.rpartition(".")[2], []).append(path)
+        return files_by_extension
+
+    def paths_matching(self, file_pattern: str | re.Pattern[str]) -> list[str]:
+        """The file list is only scanned once per pattern, e.g. `csproj` and `backend_versions` share the result"""
+        pattern = App.make_pattern(file_pattern)
+        if (paths := self.__paths.get(pattern)) is None:
+            matches = App.make_matcher(pattern)
+            extension = App.pattern_extension(pattern)
+            candidates = self.files if extension is None else self.files_by_extension.get(extension, [])
+            paths = self.__paths[pattern] = [path for path in candidates if matches(path)]
+        return paths
+
+    def file_exists(self, file_pattern: str | re.Pattern[str]):
+        return len(self.paths_matching(file_pattern)) > 0
+
+    def files_matching(self, file_pattern: str | re.Pattern[str]):
+        return IterContainer(self.paths_matching(file_pattern)).map(
+            lambda path: (self.read(path), path, self.get_remote_file_url(path))
         )
 
     @cached_property
     def application_metadata(self) -> Json:
-        return (
-            self.files_matching(r"/App/config/applicationmetadata\.json$")
-            .map(lambda args: Json(*args))
-            .first_or_default(Json())
-        )
+        return self.files_matching(APPLICATION_METADATA_PATH).map(lambda args: Json(*args)).first_or_default(Json())
 
     @cached_property
     def layout_sets(self) -> LayoutSets:
         layout_sets = (
-            self.files_matching(r"/App/ui/layout-sets\.json$")
-            .map(lambda args: LayoutSets(*args))
-            .first_or_default(LayoutSets())
+            self.files_matching(LAYOUT_SETS_PATH).map(lambda args: LayoutSets(*args)).first_or_default(LayoutSets())
         )
 
-        # Get the json of each layout set (if applicable), base path to the layout set, and path to layout files
+        # Get the json of each layout set (if applicable), paths of the layout set files, and path to layout files
         layout_set_info = cast(
-            IterContainer[tuple[LayoutSetJson | None, str, str]],
+            IterContainer[tuple[LayoutSetJson | None, LayoutSetPaths, re.Pattern[str]]],
             (
                 # Multiple layout sets, read paths from layout-sets.json
-                IterContainer(layout_sets.json["sets"]).map(lambda set_json: (set_json, f"/App/ui/{set_json['id']}/"))
+                IterContainer(layout_sets.json["sets"]).map(
+                    lambda set_json: (set_json, layout_set_paths(f"/App/ui/{set_json['id']}/"))
+                )
                 if layout_sets.json is not None
                 # Only one layout set, directly in /ui/
-                else IterContainer([(None, "/App/ui/")])
+                else IterContainer([(None, layout_set_paths("/App/ui/"))])
             ).starmap(
-                lambda set_json, base_path: (
+                lambda set_json, paths: (
                     # Multiple layout files, in /ui/(.+/)?layouts/
-                    (set_json, base_path, multi_path)
-                    if self.file_exists(multi_path := rf"{base_path}layouts/[^/]+\.json$")
+                    (set_json, paths, paths.layouts)
+                    if self.file_exists(paths.layouts)
                     else (
                         # Single layout file, in /ui/FormLayout.json
-                        (set_json, base_path, single_path)
-                        if self.file_exists(single_path := rf"{base_path}FormLayout\.json$")
+                        (set_json, paths, paths.form_layout)
+                        if self.file_exists(paths.form_layout)
                         # No layout files
                         else None
                     )
@@ -232,7 +465,7 @@ class App:
 
         return layout_sets.set_sets(
             layout_set_info.starmap(
-                lambda set_json, base_path, layouts_path: (
+                lambda set_json, paths, layouts_path: (
                     layout_set := LayoutSet(
                         set_json,
                         # Layouts
@@ -240,15 +473,15 @@ class App:
                         .map(lambda args: Layout(*args).set_layout_set(layout_set))
                         .filter(lambda layout: layout.exists),
                         # LayoutSettings
-                        self.files_matching(rf"{base_path}Settings\.json$").map(
+                        self.files_matching(paths.settings).map(
                             lambda args: LayoutSettings(*args).set_layout_set(layout_set)
                         ),
                         # RuleConfiguration
-                        self.files_matching(rf"{base_path}RuleConfiguration\.json$").map(
+                        self.files_matching(paths.rule_configuration).map(
                             lambda args: RuleConfiguration(*args).set_layout_set(layout_set)
                         ),
                         # RuleHandler
-                        self.files_matching(rf"{base_path}RuleHandler\.js$").map(
+                        self.files_matching(paths.rule_handler).map(
                             lambda args: RuleHandler(*args).set_layout_set(layout_set)
                         ),
                         # LayoutSets
@@ -264,7 +497,8 @@ class App:
 
     @cached_property
     def components(self) -> IterContainer[Component]:
-        return self.layout_sets.sets.flat_map(lambda set: set.layouts.flat_map(lambda layout: layout.components))
+        # Shares the parsed layouts with `layouts`, instead of walking the layout sets again
+        return self.layouts.flat_map(lambda layout: layout.components)
 
     @cached_property
     def layout_settings(self) -> IterContainer[LayoutSettings]:
@@ -285,7 +519,7 @@ class App:
     @cached_property
     def text_resources(self) -> IterContainer[TextResource]:
         return (
-            self.files_matching(r"/App/config/texts/resource\.[a-z]{2}\.json$")
+            self.files_matching(TEXT_RESOURCE_PATH)
             .map(lambda args: TextResource(*args))
             .filter(lambda file: file.exists)
         )
@@ -293,83 +527,98 @@ class App:
     @cached_property
     def app_settings(self) -> IterContainer[Appsettings]:
         return (
-            self.files_matching(r"/App/appsettings(\.[^.]+)?\.json$")
-            .map(lambda args: Appsettings(*args))
-            .filter(lambda file: file.exists)
+            self.files_matching(APP_SETTINGS_PATH).map(lambda args: Appsettings(*args)).filter(lambda file: file.exists)
         )
 
     @cached_property
     def cs(self) -> IterContainer[CsCode]:
-        return self.files_matching(r"\.cs$").map(lambda args: CsCode(*args)).filter(lambda file: file.exists)
+        return self.files_matching(CS_PATH).map(lambda args: CsCode(*args)).filter(lambda file: file.exists)
 
     @cached_property
     def program_cs(self) -> ProgramCs:
-        return (
-            self.files_matching(r"/App/Program\.cs$").map(lambda args: ProgramCs(*args)).first_or_default(ProgramCs())
-        )
+        return self.files_matching(PROGRAM_CS_PATH).map(lambda args: ProgramCs(*args)).first_or_default(ProgramCs())
 
     @cached_property
     def index_cshtml(self) -> Html:
-        return (
-            self.files_matching(r"/App/views/Home/Index\.cshtml$")
-            .map(lambda args: Html(*args))
-            .first_or_default(Html())
-        )
+        return self.files_matching(INDEX_CSHTML_PATH).map(lambda args: Html(*args)).first_or_default(Html())
 
     @cached_property
     def process(self) -> Process:
-        return (
-            self.files_matching(r"/App/config/process/process\.bpmn$")
-            .map(lambda args: Process(*args))
-            .first_or_default(Process())
-        )
+        return self.files_matching(PROCESS_PATH).map(lambda args: Process(*args)).first_or_default(Process())
 
     @cached_property
     def policy(self) -> Xml:
-        return (
-            self.files_matching(r"/App/config/authorization/policy\.xml$")
-            .map(lambda args: Xml(*args))
-            .first_or_default(Xml())
-        )
+        return self.files_matching(POLICY_PATH).map(lambda args: Xml(*args)).first_or_default(Xml())
 
     @cached_property
     def csproj(self) -> IterContainer[Xml]:
-        return self.files_matching(r"\.csproj$").map(lambda args: Xml(*args)).filter(lambda file: file.exists)
+        return self.files_matching(CSPROJ_PATH).map(lambda args: Xml(*args)).filter(lambda file: file.exists)
 
     @cached_property
     def dockerfile(self) -> Code[Dockerfile]:
         return (
-            self.files_matching(r"Dockerfile")
+            self.files_matching(DOCKERFILE_PATH)
             .map(lambda args: Code.dockerfile(*args))
             .first_or_default(Code.dockerfile())
         )
 
-    @cached_property
-    def frontend_version(self) -> Version:
-        return Version(
-            self.index_cshtml.xpath(
-                r'//script/@src/analyze-string(., "^https://altinncdn.no/toolkits/altinn-app-frontend/([a-zA-Z0-9\-.]+)/altinn-app-frontend.js$")/fn:match/fn:group[@nr=1]/text()',
-            )
-            .map(lambda value: value.text)
-            .first
-        )
-
-    @cached_property
-    def backend_versions(self) -> IterContainer[Version]:
+    def __version_files(self) -> str | None:
+        """Finds Index.cshtml and the .csproj files in a single pass over the file list, `csproj` reuses the latter"""
+        is_csproj = App.make_matcher(CSPROJ_PATH)
+        is_index_cshtml = App.make_matcher(INDEX_CSHTML_PATH)
+        index_cshtml: str | None = None
+        csproj: list[str] = []
+        for path in self.files:
+            if is_csproj(path):
+                csproj.append(path)
+            elif index_cshtml is None and is_index_cshtml(path):
+                index_cshtml = path
+        self.__paths[App.make_pattern(CSPROJ_PATH)] = csproj
+        return index_cshtml
+
+    def __frontend_version(self, index_cshtml: str | None) -> Version:
+        # Searches the raw bytes of Index.cshtml instead of parsing it as HTML, only the captured version is decoded
+        if index_cshtml is None:
+            return Version(None)
+        # Decompression stops at the first match
+        version = frontend_version_in_chunks(self.read_chunks(index_cshtml))
+        return parse_version(version) if version is not None else Version(None)
+
+    def __backend_versions(self) -> IterContainer[Version]:
+        # The parsed .csproj files are shared with `dotnet_versions`, only the XPath query is skipped
         return (
-            self.csproj.flat_map(
-                lambda csproj: csproj.xpath(
-                    r'.//PackageReference[matches(@Include, "^Altinn\.App\.(Core|Api|Common)(\.Experimental)?$", "i")]/@Version'
-                ).map(lambda value: Version(value.text))
-            )
+            self.csproj.flat_map(package_versions)
+            .map(parse_version)
             .filter(lambda version: version.exists)
             .sort(reverse=True)
             .unique(lambda version: version.value)
         )
 
+    @cached_property
+    def __versions(self) -> tuple[Version, Version]:
+        """Frontend and backend version, found together and shared by every `App` of the same deployment"""
+        key = (self.key, self.commit_sha)
+        if (versions := version_cache.get(key)) is None:
+            index_cshtml = self.__version_files()
+            versions = (
+                self.__frontend_version(index_cshtml),
+                self.__backend_versions().first_or_default(Version(None)),
+            )
+            version_cache[key] = versions
+            unsaved_versions.add(key)
+        return versions
+
+    @cached_property
+    def frontend_version(self) -> Version:
+        return self.__versions[0]
+
+    @cached_property
+    def backend_versions(self) -> IterContainer[Version]:
+        return self.__backend_versions()
+
     @cached_property
     def backend_version(self) -> Version:
-        return self.backend_versions.first_or_default(Version(None))
+        return self.__versions[1]
 
     @cached_property
     def dotnet_versions(self) -> IterContainer[NullableStr]:
@@ -384,25 +633,135 @@ class App:
 
     @cached_property
     def dotnet_version(self) -> NullableStr:
-        return self.dotnet_versions.first_or_default(NullableStr(None))
+        # Shared like the frontend and backend versions, so copies made by `select` don't parse the .csproj again
+        key = (self.key, self.commit_sha)
+        if (version := dotnet_version_cache.get(key)) is None:
+            version = dotnet_version_cache[key] = self.dotnet_versions.first_or_default(NullableStr(None))
+        return version
+
+
+def find_app_versions(
+    args: tuple[Environment, str, str, str, StudioEnvironment, Path],
+) -> tuple[str | None, str | None]:
+    """Runs in a worker process, so it only takes and returns values that can be pickled"""
+    make_warnings_ctx()
+    frontend_version, backend_version = App.wrap_open_app(lambda app: (app.frontend_version, app.backend_version))(
+        App(*args)
+    )
+    return frontend_version.value, backend_version.value
+
+
+def versions_path(apps_dir: Path) -> Path:
+    return Path.joinpath(apps_dir, ".apps.versions.json")
+
+
+def is_versions_data(data: object) -> bool:
+    return (
+        isinstance(data, dict)
+        and isinstance(data.get("commit_sha"), str)
+        and isinstance(data.get("mtime_ns"), int)
+        and isinstance(data.get("size"), int)
+        and isinstance(data.get("frontend_version", 0), str | None)
+        and isinstance(data.get("backend_version", 0), str | None)
+    )
+
+
+def read_versions(path: Path) -> VersionsLock:
+    """
+    The saved versions are only a cache, an unreadable file is treated as empty and replaced on the next save.
+    Entries that are not as expected, e.g. from an older format, are left out the same way.
+    """
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return {}
+    try:
+        versions_lock = json.loads(data)
+    except json.JSONDecodeError:
+        return {}
+    if not isinstance(versions_lock, dict):
+        return {}
+    return {key: cast(VersionsData, entry) for key, entry in versions_lock.items() if is_versions_data(entry)}
+
+
+def load_versions(apps_dir: Path):
+    """Fills the version cache with versions saved in an earlier session"""
+    for key, data in read_versions(versions_path(apps_dir)).items():
+        # A zip file downloaded again since the versions were saved could have different content for the same commit
+        try:
+            stat = Path.joinpath(apps_dir, f"{key}.zip").stat()
+        except OSError:
+            continue
+        if (stat.st_mtime_ns, stat.st_size) != (data["mtime_ns"], data["size"]):
+            continue
+        version_cache[(key, data["commit_sha"])] = (
+            Version.from_value(data["frontend_version"]),
+            Version.from_value(data["backend_version"]),
+        )
+
+
+def save_versions(keys: Iterable[tuple[str, str]]):
+    versions_locks: dict[Path, VersionsLock] = {}
+    for key, commit_sha in keys:
+        versions = version_cache.get((key, commit_sha))
+        file_path = app_files.get((key, commit_sha))
+        if versions is None or file_path is None:
+            continue
+        unsaved_versions.discard((key, commit_sha))
+        if (versions_lock := versions_locks.get(file_path.parent)) is None:
+            versions_lock = versions_locks[file_path.parent] = read_versions(versions_path(file_path.parent))
+        stat = file_path.stat()
+        versions_lock[key] = VersionsData(
+            commit_sha=commit_sha,
+            mtime_ns=stat.st_mtime_ns,
+            size=stat.st_size,
+            frontend_version=versions[0].value,
+            backend_version=versions[1].value,
+        )
+
+    # Written to a temporary file and renamed over the old one, so an interrupted save never leaves it truncated
+    for apps_dir, versions_lock in versions_locks.items():
+        path = versions_path(apps_dir)
+        temp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        try:
+            with open(temp_path, "w") as f:
+                json.dump(dict(sorted(versions_lock.items())), f, indent=2)
+            os.replace(temp_path, path)
+        finally:
+            temp_path.unlink(missing_ok=True)
 
 
 class Apps(IterController[App]):
     def __init__(
         self,
         apps: IterContainer[App],
-        groupings: dict[str, object] = {},
-        selector: dict[str, Callable[[Apps], object]] = {},
+        groupings: dict[str, object] | None = None,
+        selector: dict[str, Callable[[Apps], object]] | None = None,
+        archives: ArchiveCache | None = None,
     ):
         super().__init__(apps)
-        self.groupings = groupings
-        self.selector = selector
+        self.groupings = groupings if groupings is not None else {}
+        self.selector = selector if selector is not None else {}
+        self.archives = archives
+        self.group_keys = tuple(self.groupings.keys())
+        self.group_values = tuple(self.groupings.values())
+        self.data_keys = tuple(self.selector.keys())
 
     def with_iterable(self, iterable: IterContainer[App]):
-        return Apps(iterable, self.groupings, self.selector)
+        return Apps(iterable, self.groupings, self.selector, self.archives)
+
+    def __exit__(self, type, value, traceback):
+        # Versions found by queries are saved as well, not only those from `find_versions`. Not when exiting on an
+        # exception though, e.g. a `KeyboardInterrupt` means the user wants out, not to wait for a save. Only versions
+        # already found are saved, a pipeline that was never consumed is not run just for this
+        if type is None and len(unsaved_versions) > 0:
+            save_versions(list(unsaved_versions))
+        super().__exit__(type, value, traceback)
+        if self.archives is not None:
+            self.archives.close()
 
     def with_selector(self, data: dict[str, Callable[[Apps], object]]) -> Apps:
-        return Apps(self.i, self.groupings, data)
+        return Apps(self.i, self.groupings, data, self.archives)
 
     @staticmethod
     def wrap_with_selector(selector: dict[str, Callable[[Apps], object]]) -> Callable[[Apps], Apps]:
@@ -412,11 +771,13 @@ class Apps(IterController[App]):
         return func
 
     def data_table(self, raw=False):
-        headers = ["Env", "Org", "App", *self.list[0].data_keys]
-        rows = [
-            [app.env, app.org, app.app, *map(lambda value: value if raw else str(value), app.data_values)]
-            for app in self.list
-        ]
+        apps = self.list
+        headers = ["Env", "Org", "App", *apps[0].data_keys]
+        # The raw check is done once for the table instead of once per cell
+        if raw:
+            rows = [[app.env, app.org, app.app, *app.data_values] for app in apps]
+        else:
+            rows = [[app.env, app.org, app.app, *map(str, app.data_values)] for app in apps]
         return headers, rows
 
     def table(self):
@@ -471,55 +832,84 @@ class Apps(IterController[App]):
         return self
 
     @classmethod
-    def init(cls, apps_dir: Path = Path("./data"), max_open_files=100) -> Apps:
+    def init(cls, apps_dir: Path = Path("./data"), max_open_files=100, max_workers: int | None = None) -> Apps:
         lock_path = Path.joinpath(apps_dir, ".apps.lock.json")
         if not lock_path.exists():
             print("Failed to locate lock file")
             exit(1)
 
-        with open(lock_path, "r") as f:
-            lock_file: VersionLock = json.load(f)
-
-        apps: list[App] = []
-        for lock_data in lock_file.values():
-            if lock_data["status"] == "success":
-                apps.append(
-                    App(
-                        lock_data["env"],
-                        lock_data["org"],
-                        lock_data["app"],
-                        lock_data["commit_sha"],
-                        lock_data["studio_env"],
-                        apps_dir,
-                    )
-                )
+        with open(lock_path, "rb") as f:
+            lock_file: VersionLock = rapidjson.loads(f.read())
+
+        archives = ArchiveCache(max_open_files)
+        apps = [
+            App(
+                lock_data["env"],
+                lock_data["org"],
+                lock_data["app"],
+                lock_data["commit_sha"],
+                lock_data["studio_env"],
+                apps_dir,
+                archives,
+            )
+            for lock_data in lock_file.values()
+            if lock_data["status"] == "success"
+        ]
+
+        load_versions(apps_dir)
+        for app in apps:
+            app_files[(app.key, app.commit_sha)] = app.file_path
 
         make_warnings_ctx()
         args = (contextvars.copy_context(),)
 
         def set_context(context: contextvars.Context):
+            mark_worker_thread()
             for var, value in context.items():
                 var.set(value)
 
-        executor = ThreadPoolExecutor(max_workers=max_open_files, initializer=set_context, initargs=args)
-
-        return cls(IterContainer(apps, executor))
+        # Reading zip files is mostly decompression and regex work, more threads than this just contend for the GIL.
+        # The workers and the thread consuming their results (which maps the first chunk itself) each have at most one
+        # app open, an archive uses one file and idle ones are closed by the cache. So one file is left for the consuming
+        # thread, and with a limit of one file it does all the work
+        if max_workers is None:
+            max_workers = min(32, (os.cpu_count() or 4) * 2)
+        max_workers = min(max_workers, max_open_files - 1)
+        executor = (
+            ThreadPoolExecutor(max_workers=max_workers, initializer=set_context, initargs=args)
+            if max_workers > 0
+            else None
+        )
 
-    @cached_property
-    def group_keys(self) -> list[str]:
-        return list(self.groupings.keys())
+        return cls(IterContainer(apps, executor, max(1, max_workers)), archives=archives)
 
-    @cached_property
-    def group_values(self) -> list[object]:
-        return list(self.groupings.values())
+    def prefetch(self, *file_patterns: str | re.Pattern[str]) -> Apps:
+        """Reads the file list and matching files of every app up front, by default the files used to find versions"""
+        patterns = file_patterns if len(file_patterns) > 0 else (INDEX_CSHTML_PATH, CSPROJ_PATH)
+        self.i.map(App.wrap_open_app(lambda app: app.prefetch(patterns))).list  # Consume iterator
+        return self
 
-    @cached_property
-    def data_keys(self) -> list[str]:
-        return list(self.selector.keys())
+    def find_versions(self, max_workers: int | None = None) -> Apps:
+        """
+        Finds frontend and backend versions in worker processes, since decompressing and searching is CPU bound.
+        The result is saved next to the lock file, and `Apps.init` loads it so later sessions skip the zip files.
+        """
+        apps = [app for app in self.list if (app.key, app.commit_sha) not in version_cache]
+        args = [(app.env, app.org, app.app, app.commit_sha, app.studio_env, app.app_dir) for app in apps]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            for app, (frontend_version, backend_version) in zip(
+                apps, executor.map(find_app_versions, args, chunksize=16)
+            ):
+                version_cache[(app.key, app.commit_sha)] = (
+                    Version.from_value(frontend_version),
+                    Version.from_value(backend_version),
+                )
+        save_versions([(app.key, app.commit_sha) for app in self.list])
+        return self
 
     @cached_property
-    def data_values(self) -> list[object]:
-        return [func(self) for func in self.selector.values()]
+    def data_values(self) -> tuple[object, ...]:
+        return tuple([func(self) for func in self.selector.values()])
 
     @overload
     def __getitem__(self, key: str) -> Any: ...
@@ -550,8 +940,11 @@ class Apps(IterController[App]):
         return self.with_iterable(self.i.sort(func, reverse))
 
     def group_by(self, grouper: dict[str, Callable[[App], SupportsRichComparison]]) -> GroupedApps:
-        key_func = App.wrap_open_app(lambda app: tuple([(key, func(app)) for (key, func) in grouper.items()]))
-        map_func = lambda columns, apps: Apps(apps, dict(columns), self.selector)
+        # The group key only holds the values, the column names are attached once per group
+        keys = list(grouper.keys())
+        funcs = list(grouper.values())
+        key_func = App.wrap_open_app(lambda app: tuple([func(app) for func in funcs]))
+        map_func = lambda values, apps: Apps(apps, dict(zip(keys, values)), self.selector, self.archives)
         return GroupedApps(self.i.group_by(key_func, map_func))
 
     def unique_repos(self) -> Apps:
@@ -585,14 +978,15 @@ class GroupedApps(IterController[Apps]):
                 for group in self.list
             ]
 
-        return list(map(lambda column: ", ".join(column), columns))
+        return [", ".join(column) for column in columns]
 
     def __get_chart_values(self, y: str | None) -> ArrayLike:
         if self.length == 0:
             return []
 
         if y is None:
-            return [group.length for group in self.list]
+            # Counts are always integers, so they can go straight into an array instead of a list of boxed ints
+            return np.fromiter((group.length for group in self.list), dtype=np.int64, count=self.length)
 
         return [group[y] for group in self.list]
 
@@ -613,14 +1007,12 @@ class GroupedApps(IterController[Apps]):
         return self
 
     def data_table(self, raw=False):
-        headers = [*self.list[0].group_keys, *self.list[0].data_keys]
-        rows = [
-            [
-                *map(lambda value: str(value), group.group_values),
-                *map(lambda value: value if raw else str(value), group.data_values),
-            ]
-            for group in self.list
-        ]
+        groups = self.list
+        headers = [*groups[0].group_keys, *groups[0].data_keys]
+        if raw:
+            rows = [[*map(str, group.group_values), *group.data_values] for group in groups]
+        else:
+            rows = [[*map(str, group.group_values), *map(str, group.data_values)] for group in groups]
         return headers, rows
 
     def table(self):
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import io
+import mmap
+import os
+import struct
+import zlib
+from collections import OrderedDict
+from io import BufferedReader
+from pathlib import Path
+from threading import Lock
+from typing import IO, Callable, Iterator, NamedTuple
+from zipfile import BadZipFile, ZipFile, ZipInfo
+
+END_OF_CENTRAL_DIRECTORY = struct.Struct("<4sHHHHIIH")
+CENTRAL_DIRECTORY_HEADER = struct.Struct("<4sHHHHHHIIIHHHHHII")
+LOCAL_FILE_HEADER = struct.Struct("<4sHHHHHIIIHH")
+
+END_OF_CENTRAL_DIRECTORY_SIGNATURE = b"PK\x05\x06"
+CENTRAL_DIRECTORY_HEADER_SIGNATURE = b"PK\x01\x02"
+LOCAL_FILE_HEADER_SIGNATURE = b"PK\x03\x04"
+
+STORED = 0
+DEFLATED = 8
+ENCRYPTED_FLAG = 0x1
+UTF8_FLAG = 0x800
+ZIP64_LIMIT = 0xFFFFFFFF
+
+# Not available on Windows, where reads fall back to seek and read under a lock
+HAS_PREAD = hasattr(os, "pread")
+
+
+class Unsupported(Exception):
+    pass
+
+
+class ZipEntry(NamedTuple):
+    header_offset: int
+    compress_type: int
+    compress_size: int
+    crc: int
+
+
+class ArchiveReader(io.RawIOBase):
+    """A file object over positional reads, so a `ZipFile` can read an archive without a file position of its own"""
+
+    def __init__(self, read_at: Callable[[int, int], bytes], size: int):
+        self.__read_at = read_at
+        self.__size = size
+        self.__position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.__position
+
+    def seek(self, offset: int, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self.__position
+        elif whence == os.SEEK_END:
+            offset += self.__size
+        if offset < 0:
+            raise ValueError("negative seek position")
+        self.__position = offset
+        return offset
+
+    def readinto(self, buffer):
+        data = self.__read_at(self.__position, len(buffer))
+        buffer[: len(data)] = data
+        self.__position += len(data)
+        return len(data)
+
+
+class ZipArchive:
+    """
+    Reads the central directory into a dict of the few fields needed to inflate a member, instead of a `ZipInfo` per
+    file. Archives using features beyond stored/deflated members (zip64, encryption, ...) are handed over to `ZipFile`.
+
+    `open`, `getinfo` and `infolist` are served by a `ZipFile` reading through the archive, created the first time one
+    is used. It needs no file of its own and sees the same content as the other methods.
+
+    The archive takes over the file and is memory mapped when possible. A mapped zip file must not be truncated or
+    rewritten in place while open, reading it would then crash the process (SIGBUS). Downloads are written to a
+    temporary file and renamed over the zip file, which leaves the mapped one intact.
+    """
+
+    def __init__(self, file: BufferedReader):
+        self.__file = file
+        self.__lock = Lock()
+        self.__mmap: mmap.mmap | None = None
+        self.__zip_file: ZipFile | None = None
+        self.__compat_zip_file: ZipFile | None = None
+        try:
+            self.__size = os.fstat(file.fileno()).st_size
+            # Members are sliced straight out of the page cache, without a syscall per read. Empty files can't be mapped
+            if self.__size > 0:
+                try:
+                    self.__mmap = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                except OSError:
+                    pass
+            try:
+                self.__entries = self.__read_central_directory()
+            except Unsupported:
+                if self.__mmap is not None:
+                    self.__mmap.close()
+                    self.__mmap = None
+                self.__zip_file = ZipFile(file)
+        except BaseException:
+            self.close()
+            raise
+        # The map holds its own descriptor, so there is only one open per archive
+        if self.__mmap is not None:
+            file.close()
+
+    def __read_central_directory(self) -> dict[str, ZipEntry]:
+        size = len(self.__mmap) if self.__mmap is not None else self.__size
+        # The end of central directory record is followed by a comment of at most 0xFFFF bytes
+        tail_offset = max(0, size - END_OF_CENTRAL_DIRECTORY.size - 0xFFFF)
+        tail = self.__read_at(tail_offset, size - tail_offset)
+        start = tail.rfind(END_OF_CENTRAL_DIRECTORY_SIGNATURE)
+        if start < 0 or start + END_OF_CENTRAL_DIRECTORY.size > len(tail):
+            raise BadZipFile("File is not a zip file")
+
+        _, disk, directory_disk, _, count, directory_size, directory_offset, _ = END_OF_CENTRAL_DIRECTORY.unpack_from(
+            tail, start
+        )
+        if disk != 0 or directory_disk != 0 or count == 0xFFFF or ZIP64_LIMIT in (directory_size, directory_offset):
+            raise Unsupported()
+
+        # Data prepended to the archive shifts every offset stored in it
+        concat = tail_offset + start - directory_size - directory_offset
+        directory = self.__read_at(directory_offset + concat, directory_size)
+
+        entries: dict[str, ZipEntry] = {}
+        position = 0
+        for _ in range(count):
+            (
+                signature,
+                _,
+                _,
+                flags,
+                compress_type,
+                _,
+                _,
+                crc,
+                compress_size,
+                file_size,
+                name_length,
+                extra_length,
+                comment_length,
+                _,
+                _,
+                _,
+                header_offset,
+            ) = CENTRAL_DIRECTORY_HEADER.unpack_from(directory, position)
+            if signature != CENTRAL_DIRECTORY_HEADER_SIGNATURE:
+                raise BadZipFile("Bad magic number for central directory")
+            if (
+                flags & ENCRYPTED_FLAG
+                or compress_type not in (STORED, DEFLATED)
+                or ZIP64_LIMIT in (compress_size, file_size, header_offset)
+            ):
+                raise Unsupported()
+
+            position += CENTRAL_DIRECTORY_HEADER.size
+            name = directory[position : position + name_length].decode("utf-8" if flags & UTF8_FLAG else "cp437")
+            entries[name] = ZipEntry(header_offset + concat, compress_type, compress_size, crc)
+            position += name_length + extra_length + comment_length
+
+        return entries
+
+    def __read_at(self, offset: int, size: int) -> bytes:
+        if self.__mmap is not None:
+            return self.__mmap[offset : offset + size]
+        if HAS_PREAD:
+            return os.pread(self.__file.fileno(), size, offset)
+        with self.__lock:
+            self.__file.seek(offset)
+            return self.__file.read(size)
+
+    def __compat(self) -> ZipFile:
+        if self.__zip_file is not None:
+            return self.__zip_file
+        if self.__compat_zip_file is None:
+            # Created outside the lock, reads without a map or `pread` take it. If another thread got there first its
+            # `ZipFile` is used instead
+            size = len(self.__mmap) if self.__mmap is not None else self.__size
+            zip_file = ZipFile(ArchiveReader(self.__read_at, size))
+            with self.__lock:
+                if self.__compat_zip_file is None:
+                    self.__compat_zip_file = zip_file
+            if self.__compat_zip_file is not zip_file:
+                zip_file.close()
+        return self.__compat_zip_file
+
+    def open(self, name: str | ZipInfo) -> IO[bytes]:
+        return self.__compat().open(name)
+
+    def getinfo(self, name: str) -> ZipInfo:
+        return self.__compat().getinfo(name)
+
+    def infolist(self) -> list[ZipInfo]:
+        return self.__compat().infolist()
+
+    def namelist(self) -> list[str]:
+        if self.__zip_file is not None:
+            return self.__zip_file.namelist()
+        return list(self.__entries)
+
+    def read(self, name: str | ZipInfo) -> bytes:
+        if self.__zip_file is not None:
+            return self.__zip_file.read(name)
+        return b"".join(self.read_chunks(name.filename if isinstance(name, ZipInfo) else name, -1))
+
+    def read_chunks(self, name: str, size=16384) -> Iterator[bytes]:
+        """Inflates a member from its local file header, reading `size` compressed bytes at a time (all if negative)"""
+        if self.__zip_file is not None:
+            with self.__zip_file.open(name) as file:
+                while chunk := file.read(size):
+                    yield chunk
+            return
+
+        entry = self.__entries[name]
+        header = self.__read_at(entry.header_offset, LOCAL_FILE_HEADER.size)
+        signature, *_, name_length, extra_length = LOCAL_FILE_HEADER.unpack(header)
+        if signature != LOCAL_FILE_HEADER_SIGNATURE:
+            raise BadZipFile("Bad magic number for file header")
+
+        # Reads are positional, so several threads can read members of the same archive at once
+        position = entry.header_offset + LOCAL_FILE_HEADER.size + name_length + extra_length
+        remaining = entry.compress_size
+        decompressor = zlib.decompressobj(-15) if entry.compress_type == DEFLATED else None
+        crc = 0
+        while remaining > 0:
+            data = self.__read_at(position, remaining if size < 0 else min(size, remaining))
+            if len(data) == 0:
+                raise EOFError()
+            position += len(data)
+            remaining -= len(data)
+            if decompressor is not None:
+                data = decompressor.decompress(data) + (decompressor.flush() if remaining == 0 else b"")
+            crc = zlib.crc32(data, crc)
+            if len(data) > 0:
+                yield data
+
+        if crc != entry.crc:
+            raise BadZipFile(f"Bad CRC-32 for file {name!r}")
+
+    def close(self):
+        if self.__zip_file is not None:
+            self.__zip_file.close()
+        if self.__compat_zip_file is not None:
+            self.__compat_zip_file.close()
+        if self.__mmap is not None:
+            self.__mmap.close()
+        self.__file.close()
+
+
+class ArchiveCache:
+    """
+    Keeps archives open between pipeline stages, so an app is not opened again for every `where`, `select`, etc.
+    Archives in use are never closed, idle ones are closed least recently used first when there are too many open.
+    """
+
+    def __init__(self, max_open_files: int):
+        self.max_open_files = max_open_files
+        self.__lock = Lock()
+        self.__archives: OrderedDict[Path, ZipArchive] = OrderedDict()
+        self.__users: dict[Path, int] = {}
+        self.__opening = 0
+
+    def acquire(self, path: Path) -> ZipArchive:
+        with self.__lock:
+            if (cached := self.__archives.get(path)) is not None:
+                self.__users[path] = self.__users.get(path, 0) + 1
+                self.__archives.move_to_end(path)
+                return cached
+            # Room is made before opening, so there are never more files open than the limit while waiting to evict
+            self.__opening += 1
+            self.__evict()
+
+        # Opened outside the lock, if another thread got there first its archive is used instead
+        try:
+            archive = ZipArchive(open(path, "rb"))
+        except BaseException:
+            with self.__lock:
+                self.__opening -= 1
+            raise
+        with self.__lock:
+            self.__opening -= 1
+            self.__users[path] = self.__users.get(path, 0) + 1
+            if (cached := self.__archives.get(path)) is None:
+                self.__archives[path] = archive
+                self.__evict()
+                return archive
+        archive.close()
+        return cached
+
+    def release(self, path: Path):
+        with self.__lock:
+            if (users := self.__users[path] - 1) > 0:
+                self.__users[path] = users
+            else:
+                del self.__users[path]
+            self.__evict()
+
+    def __evict(self):
+        excess = len(self.__archives) + self.__opening - self.max_open_files
+        if excess <= 0:
+            return
+        for path in [path for path in self.__archives if path not in self.__users][:excess]:
+            self.__archives.pop(path).close()
+
+    def close(self):
+        with self.__lock:
+            for archive in self.__archives.values():
+                archive.close()
+            self.__archives.clear()
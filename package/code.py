@@ -1,7 +1,7 @@
 from __future__ import annotations
 import random, string
 from itertools import combinations
-from functools import cached_property
+from functools import cache, cached_property
 from pathlib import Path
 from typing import Literal, Iterable, cast
 import re
@@ -108,16 +108,21 @@ class Code[L: CodeLanguage]:
             return False
         return self.text <= other_text  # type: ignore
 
-    def __matches(self, pattern: str, group: int = 0):
+    @staticmethod
+    @cache
+    def make_pattern(pattern: str | re.Pattern[str]) -> re.Pattern[str]:
+        return re.compile(pattern)
+
+    def __matches(self, pattern: str | re.Pattern[str], group: int = 0):
         if self.text is None:
             return
-        for match in re.finditer(pattern, self.text):
+        for match in Code.make_pattern(pattern).finditer(self.text):
             yield cast(str, match.group(group))
 
-    def find_all(self, pattern: str, group: int = 0):
+    def find_all(self, pattern: str | re.Pattern[str], group: int = 0):
         return IterContainer(self.__matches(pattern, group))
 
-    def find(self, pattern: str, group: int = 0):
+    def find(self, pattern: str | re.Pattern[str], group: int = 0):
         return self.find_all(pattern, group).first
 
 
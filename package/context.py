@@ -1,4 +1,3 @@
-from contextlib import contextmanager
 from typing import TYPE_CHECKING
 from contextvars import ContextVar, Token
 
@@ -18,18 +17,9 @@ def reset_warnings_ctx(token: "Token"):
     return warnings_ctx.reset(token)
 
 
-@contextmanager
-def app_context(app: "App"):
-    t = app_ctx.set(app)
-    try:
-        yield
-    finally:
-        app_ctx.reset(t)
-
-
 def log_warning(message: str):
     if (warnings := warnings_ctx.get()) is not None and (app := app_ctx.get()) is not None:
-        if next(filter(lambda w: w[0].key == app.key and w[1] == message, warnings), None) is None:
+        if not any(logged.key == app.key and logged_message == message for logged, logged_message in warnings):
             warnings.append((app, message))
 
 
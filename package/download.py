@@ -113,9 +113,12 @@ class BaseQueryClient:
         on_progress: Callable[[int | None, int | None], None] | None = None,
         attempt=1,
     ):
+        # Downloaded next to the zip file and renamed over it when complete. A running query could have the old zip file
+        # memory mapped, rewriting it in place would crash it
+        temp_path = file_path.with_name(f"{file_path.name}.tmp")
         try:
             async with self.request_queue(url):
-                async with aiofiles.open(file_path, "wb") as f:
+                async with aiofiles.open(temp_path, "wb") as f:
                     async with self.client.stream(
                         "GET",
                         url,
@@ -132,6 +135,7 @@ class BaseQueryClient:
                             await f.write(chunk)
                             if on_progress:
                                 on_progress(response.num_bytes_downloaded, total)
+            await aiofiles.os.replace(temp_path, file_path)
 
         except httpx.HTTPStatusError as e:
             if e.response.status_code == 404 or e.response.status_code == 401:
@@ -143,6 +147,9 @@ class BaseQueryClient:
             if self.debug:
                 self.console.print(f"[yellow] download_file: retrying url '{url}', attempt {attempt + 1}")
             return await self.download_file(url, file_path, token, on_progress, attempt + 1)
+        finally:
+            with suppress(FileNotFoundError):
+                await aiofiles.os.remove(temp_path)
 
 
 class QueryClient(BaseQueryClient):
@@ -3,7 +3,7 @@ import string
 from html import escape as html_escape
 from typing import Iterable
 
-from tabulate import JupyterHTMLStr, tabulate
+from tabulate import JupyterHTMLStr
 
 
 def is_html(obj: object):
@@ -39,15 +39,18 @@ def html(obj: object) -> str:
         if contains_html(obj):
             return (
                 '<div style="padding-left: 10px; border-left: 2px solid var(--jp-border-color1);">'
-                + "<br>".join(map(lambda i: html(i), obj))
+                + "<br>".join(map(html, obj))
                 + "</div><br>"
             )
-        return "[" + ", ".join(map(lambda i: html_escape(str(i)), obj)) + "]"
+        return "[" + ", ".join([html_escape(str(i)) for i in obj]) + "]"
     return html_escape(str(obj))
 
 
 def tabulate_html(_data: Iterable[Iterable[object]], headers: list[str]) -> JupyterHTMLStr:
-    data = [[html(value) for value in values] for values in _data]
+    # Assembled directly, tabulate would measure and pad every cell (including large highlighted code blocks) to align
+    # columns, which has no effect in html
+    head = "<tr>" + "".join([f"<th>{header}</th>" for header in headers]) + "</tr>"
+    body = "\n".join(["<tr>" + "".join([f"<td>{html(value)}</td>" for value in values]) + "</tr>" for values in _data])
 
     className = "".join(random.choices(string.ascii_letters, k=16))
     return JupyterHTMLStr(
@@ -66,6 +69,6 @@ def tabulate_html(_data: Iterable[Iterable[object]], headers: list[str]) -> Jupy
         </style>
         <div class="{className}">
         """
-        + tabulate(data, headers=headers, tablefmt="unsafehtml", disable_numparse=True)
+        + f"<table>\n<thead>\n{head}\n</thead>\n<tbody>\n{body}\n</tbody>\n</table>"
         + "</div>"
     )
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import TYPE_CHECKING, Callable, Sequence, overload
 
 from package.html_output import html
@@ -9,35 +11,84 @@ if TYPE_CHECKING:
     from _typeshed import SupportsRichComparison
 
 from functools import cached_property, reduce
-from itertools import compress, groupby, islice, starmap, tee
-from typing import Iterable, Iterator, TypeVar
+from itertools import compress, islice, starmap
+from operator import itemgetter
+from typing import Iterable, Iterator, TypeVar, cast
+
+# Set in the threads of the executor. Maps started from a worker, e.g. a `where` inside a grouped `select`, run inline,
+# since a worker waiting on tasks queued behind itself can deadlock the whole pool
+worker_thread = threading.local()
+
+
+def mark_worker_thread():
+    worker_thread.is_worker = True
 
 
 class IterContainer[T]:
-    def __init__(self, iterable: Iterable[T] | None = None, executor: ThreadPoolExecutor | None = None):
-        self.__iterable: Iterable[T] = iterable if iterable is not None else []
+    def __init__(
+        self, iterable: Iterable[T] | None = None, executor: ThreadPoolExecutor | None = None, max_workers: int = 1
+    ):
+        iterable = iterable if iterable is not None else []
+        # Values are pulled from the source once and kept, so the container can be iterated any number of times
+        self.__values: Sequence[T] = iterable if isinstance(iterable, Sequence) else []
+        self.__source: Iterator[T] | None = None if isinstance(iterable, Sequence) else iter(iterable)
         self.executor = executor
+        self.max_workers = max_workers
 
     def __repr__(self):
-        return "[" + ", ".join(map(lambda i: str(i), self.list)) + "]"
+        return "[" + ", ".join(map(str, self.list)) + "]"
 
     def _repr_html_(self):
         return html(self.list)
 
     def with_iterable[R](self, iterable: Iterable[R]) -> IterContainer[R]:
-        return IterContainer(iterable, self.executor)
+        return IterContainer(iterable, self.executor, self.max_workers)
 
     def __map[P, R](self, func: Callable[[P], R], iterable: Iterable[P]) -> Iterable[R]:
-        if self.executor is not None:
-            return self.executor.map(func, iterable)
+        if self.executor is not None and not getattr(worker_thread, "is_worker", False):
+            # A few tasks per worker instead of one per value, so thousands of tiny tasks don't drown in scheduling,
+            # while a worker that gets slow apps doesn't hold up the rest. Chunks are contiguous so the results can be
+            # chained back together in order
+            values = iterable if isinstance(iterable, Sequence) else list(iterable)
+            size = max(1, -(-len(values) // (self.max_workers * 4)))
+            chunks = [values[i : i + size] for i in range(0, len(values), size)]
+            # The first chunk is left to the thread consuming the results, which would otherwise just wait for it
+            futures = [
+                self.executor.submit(lambda chunk: [func(value) for value in chunk], chunk) for chunk in chunks[1:]
+            ]
+            return self.__results(func, chunks[0] if len(chunks) > 0 else [], futures)
         return map(func, iterable)
 
+    @staticmethod
+    def __results[P, R](func: Callable[[P], R], first: Iterable[P], futures: list[Future[list[R]]]) -> Iterator[R]:
+        try:
+            yield from map(func, first)
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def __replay(self) -> Iterator[T]:
+        values = cast(list[T], self.__values)
+        i = 0
+        while True:
+            if i < len(values):
+                yield values[i]
+                i += 1
+                continue
+            if self.__source is None:
+                return
+            try:
+                values.append(next(self.__source))
+            except StopIteration:
+                self.__source = None
+                return
+
     def __get_iter(self, n: int = 1) -> tuple[Iterator[T], ...]:
-        if isinstance(self.__iterable, Sequence):
-            return tuple([iter(self.__iterable) for _ in range(n)])
-        tup = tee(self.__iterable, n + 1)
-        self.__iterable = tup[0]
-        return tup[1:]
+        if self.__source is None:
+            return tuple([iter(self.__values) for _ in range(n)])
+        return tuple([self.__replay() for _ in range(n)])
 
     def __iter__(self):
         (i,) = self.__get_iter()
@@ -45,8 +96,10 @@ class IterContainer[T]:
 
     @cached_property
     def list(self) -> list[T]:
-        (iterator,) = self.__get_iter()
-        return list(iterator)
+        # A copy, the values are either the replay cache or a sequence that was passed in and could be shared
+        if self.__source is not None:
+            deque(self.__replay(), maxlen=0)
+        return list(self.__values)
 
     @cached_property
     def first(self) -> T | None:
@@ -65,7 +118,7 @@ class IterContainer[T]:
 
     @cached_property
     def length(self) -> int:
-        return len(self.list)
+        return len(self.__values) if self.__source is None else len(self.list)
 
     @property
     def is_not_empty(self) -> bool:
@@ -87,7 +140,7 @@ class IterContainer[T]:
     def __getitem__(self, key: int | slice) -> T | IterContainer[T]:
         (iterator,) = self.__get_iter()
         if isinstance(key, slice):
-            return IterContainer(islice(iterator, key.start, key.stop, key.step), self.executor)
+            return IterContainer(islice(iterator, key.start, key.stop, key.step), self.executor, self.max_workers)
         return next(islice(iterator, key, None))
 
     def __len__(self):
@@ -96,15 +149,18 @@ class IterContainer[T]:
     def __sorted(self, i: Iterable[T], key: Callable[[T], SupportsRichComparison] | None = None, reverse=False):
         """Key mapping uses ThreadPoolExecutor and sorting does not happen until generator starts being consumed"""
         func = key if key is not None else lambda t: t
-        k, v = tee(i)
-        for k, v in sorted(zip(self.__map(func, k), v), key=lambda k_v: k_v[0], reverse=reverse):
+        values = list(i)
+        # Decorate-sort-undecorate, so each key is computed once and the values themselves are never compared
+        keyed = list(zip(self.__map(func, values), values))
+        keyed.sort(key=itemgetter(0), reverse=reverse)
+        for k, v in keyed:
             yield v
 
     def __unique(self, i: Iterable[T], key: Callable[[T], object] | None):
-        k, v = tee(i)
+        values = list(i)
         seenset = set()
         seenlist = []
-        for k, v in zip(self.__map(key, k) if key is not None else k, v):
+        for k, v in zip(self.__map(key, values) if key is not None else values, values):
             try:
                 if k not in seenset:
                     seenset.add(k)
@@ -164,15 +220,32 @@ class IterContainer[T]:
 
     K = TypeVar("K")
 
+    def __grouped[K, R](
+        self, i: Iterable[T], key_func: Callable[[T], K], map_func: Callable[[K, IterContainer[T]], R]
+    ) -> Iterator[R]:
+        """Values are bucketed by key in a single pass, only the distinct keys are sorted"""
+        values = list(i)
+        buckets: dict[K, list[T]] = {}
+        unhashable: list[tuple[K, list[T]]] = []
+        for k, v in zip(self.__map(key_func, values), values):
+            try:
+                buckets.setdefault(k, []).append(v)
+            except TypeError:
+                for key, bucket in unhashable:
+                    if key == k:
+                        bucket.append(v)
+                        break
+                else:
+                    unhashable.append((k, [v]))
+        groups = sorted([*buckets.items(), *unhashable], key=itemgetter(0))  # type: ignore how can I define a generic type which "extends" SupportsRichComparison?
+        for k, bucket in groups:
+            yield map_func(k, self.with_iterable(bucket))
+
     def group_by[K, R](
         self, key_func: Callable[[T], K], map_func: Callable[[K, IterContainer[T]], R]
     ) -> IterContainer[R]:
         (a,) = self.__get_iter()
-        s = self.__sorted(a, key_func)  # type: ignore how can I define a generic type which "extends" SupportsRichComparison?
-        g = groupby(
-            s, key=key_func
-        )  # This does not use the ThreadPoolExecutor, but the sort does and so the values should be cached?
-        return self.with_iterable(starmap(lambda k, l: map_func(k, self.with_iterable(list(l))), g))
+        return self.with_iterable(self.__grouped(a, key_func, map_func))
 
 
 class IterController[T]():
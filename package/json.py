@@ -17,6 +17,9 @@ from package.html_output import file_name_html
 
 from .iter import IterContainer
 
+APPSETTINGS_ENV = re.compile(r"appsettings(\.([^.]+))?\.json$")
+TEXT_RESOURCE_LANG = re.compile(r"resource\.([a-z]{2})\.json$")
+
 
 def parse_json(data: bytes | None):
     # Ignore empty JSON files
@@ -149,7 +152,7 @@ class Appsettings(Json):
         if file_path is None:
             return None
 
-        match = re.search(r"appsettings(\.([^.]+))?\.json$", file_path)
+        match = APPSETTINGS_ENV.search(file_path)
         if match is None:
             return None
 
@@ -168,7 +171,7 @@ class TextResource(Json):
         if file_path is None:
             return None
 
-        match = re.search(r"resource\.([a-z]{2})\.json$", file_path)
+        match = TEXT_RESOURCE_LANG.search(file_path)
         if match is None:
             return None
 
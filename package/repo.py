@@ -21,6 +21,17 @@ class LockData(TypedDict):
     studio_env: StudioEnvironment
 
 
+class VersionsData(TypedDict):
+    commit_sha: str
+    mtime_ns: int
+    size: int
+    frontend_version: str | None
+    backend_version: str | None
+
+
+type VersionsLock = dict[str, VersionsData]
+
+
 @dataclass
 class Cluster:
     env: Environment
@@ -1,10 +1,34 @@
 from __future__ import annotations
 
+from functools import lru_cache
 from typing import Any
 
 import re
 
-VERSION_REGEX = r"^(\d+)(.(\d+))?(.(\d+))?(-(.+))?$"
+VERSION_REGEX = re.compile(r"^(\d+)(.(\d+))?(.(\d+))?(-(.+))?$")
+
+
+def split_version(version_string: str) -> tuple[str, str | None, str | None, str | None] | None:
+    """Major, minor, patch and preview, the same groups `VERSION_REGEX` would capture"""
+    head, separator, preview = version_string.partition("-")
+    parts = head.split(".")
+    if (
+        len(parts) <= 3
+        and all([part.isdecimal() for part in parts])
+        and (len(separator) == 0 or (len(parts) == 3 and len(preview) > 0 and "\n" not in preview))
+    ):
+        return (
+            parts[0],
+            parts[1] if len(parts) > 1 else None,
+            parts[2] if len(parts) > 2 else None,
+            preview if len(separator) > 0 else None,
+        )
+
+    # Anything else, e.g. separators other than "." or a trailing newline, is left to the regex
+    match = VERSION_REGEX.match(version_string)
+    if match is None:
+        return None
+    return (match.group(1), match.group(3), match.group(5), match.group(7))
 
 
 class NullableStr:
@@ -38,6 +62,9 @@ class NullableStr:
         other = NullableStr.from_value(other_value)
         return self.value == other.value
 
+    def __hash__(self):
+        return hash(self.value)
+
     def __ne__(self, other_value):
         other = NullableStr.from_value(other_value)
         return self.value != other.value
@@ -91,6 +118,9 @@ class NullableInt:
         other = NullableInt.from_value(other_value)
         return self.value == other.value
 
+    def __hash__(self):
+        return hash(self.value)
+
     def __ne__(self, other_value):
         other = NullableInt.from_value(other_value)
         return self.value != other.value
@@ -113,11 +143,18 @@ class NullableInt:
 class Version(str):
     def __init__(self, version_string: str | None):
         self.value = version_string
-        self.__match = re.match(VERSION_REGEX, version_string) if version_string is not None else None
-        self.major = NullableInt(self.__match.group(1) if self.__match else None)
-        self.minor = NullableInt(self.__match.group(3) if self.__match else None)
-        self.patch = NullableInt(self.__match.group(5) if self.__match else None)
-        self.preview = self.__match.group(7) if self.__match else None
+        groups = split_version(version_string) if version_string is not None else None
+        self.__exists = groups is not None
+        major, minor, patch, self.preview = groups if groups is not None else (None, None, None, None)
+        self.major = NullableInt(major)
+        self.minor = NullableInt(minor)
+        self.patch = NullableInt(patch)
+        # Missing components sort after any present one, so comparisons are a single tuple comparison
+        self.__key = (
+            self.major.value,
+            (0, self.minor.value) if self.minor.exists else (1,),
+            (0, self.patch.value) if self.patch.exists else (1,),
+        )
 
     def __repr__(self):
         return self.value if self.value is not None else "None"
@@ -127,7 +164,7 @@ class Version(str):
         if isinstance(value, Version):
             return value
         if isinstance(value, str):
-            return Version(value)
+            return parse_version(value)
         return Version(None)
 
     def __le__(self, other_value):
@@ -146,6 +183,10 @@ class Version(str):
         other = Version.from_value(other_value)
         return self.value == other.value
 
+    # Consistent with `__eq__`, so versions can be used as dict keys, e.g. when grouping
+    def __hash__(self):
+        return hash(self.value)
+
     """ Assuming that None is the smallest value, and that missing components makes it bigger, i.e. 4 > 4.18 """
 
     def __lt__(self, other_value):
@@ -153,22 +194,8 @@ class Version(str):
         if not self.exists or not other.exists:
             return other.exists
 
-        if self.major != other.major:
-            return self.major < other.major
-
-        if self.minor != other.minor:
-            if not self.minor.exists:
-                return False
-            if not other.minor.exists:
-                return True
-            return self.minor < other.minor
-
-        if self.patch != other.patch:
-            if not self.patch.exists:
-                return False
-            if not other.patch.exists:
-                return True
-            return self.patch < other.patch
+        if self.__key != other.__key:
+            return self.__key < other.__key
 
         if self.preview != other.preview:
             if self.preview is None:
@@ -183,22 +210,8 @@ class Version(str):
         if not self.exists or not other.exists:
             return self.exists
 
-        if self.major != other.major:
-            return self.major > other.major
-
-        if self.minor != other.minor:
-            if not self.minor.exists:
-                return True
-            if not other.minor.exists:
-                return False
-            return self.minor > other.minor
-
-        if self.patch != other.patch:
-            if not self.patch.exists:
-                return True
-            if not other.patch.exists:
-                return False
-            return self.patch > other.patch
+        if self.__key != other.__key:
+            return self.__key > other.__key
 
         if self.preview != other.preview:
             if self.preview is None:
@@ -210,4 +223,11 @@ class Version(str):
 
     @property
     def exists(self):
-        return self.__match is not None
+        return self.__exists
+
+
+# Most apps share a handful of versions, and comparisons like `app.frontend_version >= "4.0.0"` would otherwise parse
+# the same string once per app, so each distinct version string is only parsed once
+@lru_cache(maxsize=1024)
+def parse_version(version_string: str) -> Version:
+    return Version(version_string)
@@ -166,8 +166,11 @@ class Xml[X = _Element]:
         return self.xpath(query)[slice_key]
 
 
+NS_DECLARATION = re.compile(r'\s(xmlns:[\w\d_\-.]+|targetNamespace)="[^"]*"')
+
+
 def strip_ns_declarations(xml_str: str):
-    return re.sub(r'\s(xmlns:[\w\d_\-.]+|targetNamespace)="[^"]*"', "", xml_str)
+    return NS_DECLARATION.sub("", xml_str)
 
 
 class ProcessTask(Xml):